@@ -0,0 +1,133 @@
+from collections import OrderedDict
+import numpy as np
+
+def binomial_parity(n, k):
+    # C(n, k) is odd exactly when adding k and n - k in binary carries
+    # nowhere (Lucas' theorem for p = 2)
+    n, k = np.asarray(n), np.asarray(k)
+
+    return (0 <= k) & (k <= n) & ((k & (n - k)) == 0)
+
+def binomial_mod(n, k, p):
+    # Lucas' theorem: C(n, k) mod p is the product of the binomials of the
+    # base-p digits of n and k
+    n, k = np.broadcast_arrays(np.asarray(n, dtype=np.int64), np.asarray(k, dtype=np.int64))
+    valid = (0 <= k) & (k <= n)
+    n, k = np.where(valid, n, 0), np.where(valid, k, 0)
+
+    digits = np.zeros((p, p), dtype=np.int64)
+    digits[:, 0] = 1
+    for i in range(1, p):
+        digits[i, 1:] = (digits[i - 1, 1:] + digits[i - 1, :-1]) % p
+
+    result = np.ones(n.shape, dtype=np.int64)
+    while np.any(n):
+        result = result * digits[n % p, k % p] % p
+        n, k = n // p, k // p
+
+    return np.where(valid, result, 0)
+
+def parity_rows(size, p=2):
+    # Row n of the result holds C(n, k) mod p for k = 0..n, padded with zeros
+    n, k = np.indices((size, size))
+
+    if p == 2:
+        return binomial_parity(n, k).astype(np.int64)
+
+    return binomial_mod(n, k, p)
+
+# Samples handled at once by sierpinski_coverage
+COVERAGE_BAND = 2 ** 22
+
+def sierpinski_coverage(depth, resolution):
+    # How much of every pixel is covered by the triangle of the first 2^depth
+    # rows, and how much by its odd cells. Cells are squares laid out like the
+    # triangles in the presentation, and every pixel is supersampled so
+    # rows thinner than a pixel blend instead of aliasing. Samples are taken
+    # one band of pixel rows at a time, so memory doesn't grow with the depth
+    size = 2 ** depth
+    samples = max(1, -(-size // resolution))
+    width = resolution * samples
+    band = max(1, COVERAGE_BAND // width)
+
+    x = (np.arange(width) + 0.5) * size / width
+    inside = np.zeros((resolution, resolution))
+    odd = np.zeros((resolution, resolution))
+
+    for start in range(0, resolution, band):
+        stop = min(start + band, resolution)
+
+        for offset in range(samples):
+            y = (np.arange(start, stop) * samples + offset + 0.5) * size / width
+            n = y.astype(np.int64)[:, None]
+            k = np.floor(x - size / 2 + n / 2 + 0.5).astype(np.int64)
+
+            inside[start:stop] += ((0 <= k) & (k <= n)).reshape(stop - start, resolution, samples).sum(axis=2)
+            odd[start:stop] += binomial_parity(n, k).reshape(stop - start, resolution, samples).sum(axis=2)
+
+    return inside / samples ** 2, odd / samples ** 2
+
+# Largest row whose entries all fit in an int64
+INT64_ROWS = 66
+
+def next_row(row):
+    if len(row) == INT64_ROWS + 1:
+        row = row.astype(object)
+
+    return np.concatenate((row[:1], row[1:] + row[:-1], row[:1]))
+
+def binomial_row(n):
+    # Multiplicative formula, C(n, k + 1) = C(n, k) * (n - k) / (k + 1)
+    values = [1]
+    for k in range(n):
+        values.append(values[-1] * (n - k) // (k + 1))
+
+    return np.array(values, dtype=np.int64 if n <= INT64_ROWS else object)
+
+class BinomialRows:
+    # Rows of Pascal's triangle as arrays, built from their neighbour when it is
+    # stored and from the multiplicative formula otherwise. Only the max_rows
+    # most recently used rows are kept
+
+    def __init__(self, max_rows=256):
+        self.max_rows = max_rows
+        self.rows = OrderedDict()
+
+    def row(self, n):
+        if n in self.rows:
+            self.rows.move_to_end(n)
+            return self.rows[n]
+
+        if n - 1 in self.rows:
+            row = next_row(self.rows[n - 1])
+        else:
+            row = binomial_row(n)
+
+        self.rows[n] = row
+        if len(self.rows) > self.max_rows:
+            self.rows.popitem(last=False)
+
+        return row
+
+    def get(self, n, k):
+        if k < 0 or n < k:
+            return 0
+
+        return int(self.row(n)[k])
+
+    def stream(self, start=0, stop=None):
+        # Rows start..stop - 1 one after another, without storing them
+        n, row = start, self.row(start)
+        while stop is None or n < stop:
+            yield row
+            n, row = n + 1, next_row(row)
+
+def diagonal_sums(count):
+    # Sums of the shallow diagonals, entry n is C(n, 0) + C(n - 1, 1) + ...,
+    # which is the Fibonacci number F(n + 1)
+    sums = np.zeros(count, dtype=np.int64 if count <= INT64_ROWS else object)
+    for n, row in enumerate(BinomialRows().stream(0, count)):
+        length = min(len(row), count - n)
+        sums[n:n + length] += row[:length]
+
+    return sums
@@ -0,0 +1,31 @@
+from functools import lru_cache
+import numpy as np
+
+# Largest index whose Fibonacci number fits in an int64
+INT64_TERMS = 92
+
+@lru_cache(maxsize=1024)
+def fib_pair(n):
+    # (F(n), F(n + 1)) by fast doubling:
+    # F(2m) = F(m) * (2F(m + 1) - F(m)), F(2m + 1) = F(m)^2 + F(m + 1)^2
+    if n == 0:
+        return (0, 1)
+
+    a, b = fib_pair(n // 2)
+    c = a * (2 * b - a)
+    d = a * a + b * b
+
+    return (d, c + d) if n & 1 else (c, d)
+
+def fib(n):
+    return fib_pair(n)[0]
+
+def fib_terms(count):
+    # F(0)..F(count - 1) as one array
+    terms = np.zeros(count, dtype=np.int64 if count <= INT64_TERMS + 1 else object)
+    a, b = 0, 1
+    for i in range(count):
+        terms[i] = a
+        a, b = b, a + b
+
+    return terms
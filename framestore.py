@@ -0,0 +1,171 @@
+import cv2
+import json
+import numpy as np
+import os
+import screeninfo
+import struct
+import sys
+
+# Raw frame store: a header, the stored frames back to back with a fixed
+# stride, then a table mapping every frame to a stored frame. Consecutive
+# identical frames (the holds) are only stored once.
+
+MAGIC = b"PTFS"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIIdII")
+HEADER_SIZE = 64
+
+VIDEO_DIR = "snippets/videos"
+FRAME_DIR = "snippets/frames"
+SLIDE_INDEX = "snippets/slides.json"
+
+def fit(width, height, screen_width, screen_height):
+    # Largest size with the aspect ratio of the frames that fits the screen
+    scale = min(screen_width / width, screen_height / height)
+
+    return round(width * scale), round(height * scale)
+
+def scale(frame, size):
+    if frame.shape[1::-1] == size:
+        return frame
+
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+def convert(video_path, store_path, screen_size=None):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    temp_path = store_path + ".part"
+    f = open(temp_path, "wb")
+    f.write(bytes(HEADER_SIZE))
+
+    table = []
+    stored = 0
+    last = None
+    while True:
+        ret, frame = cap.read()
+
+        if ret == False:
+            break
+
+        # Frames are stored at the size they will be shown at, so the player
+        # never resamples them
+        if screen_size is not None:
+            frame = scale(frame, fit(frame.shape[1], frame.shape[0], *screen_size))
+
+        if last is None or not np.array_equal(frame, last):
+            f.write(np.ascontiguousarray(frame).tobytes())
+            last = frame
+            stored += 1
+        table.append(stored - 1)
+
+    cap.release()
+
+    height, width, channels = last.shape
+    f.write(np.array(table, dtype=np.uint32).tobytes())
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, width, height, channels, fps, len(table), stored))
+    f.close()
+
+    os.replace(temp_path, store_path)
+
+class FrameStore:
+    def __init__(self, path):
+        f = open(path, "rb")
+        magic, version, width, height, channels, self.fps, count, stored = HEADER.unpack(f.read(HEADER.size))
+        f.close()
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} frame store")
+
+        self.frames = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER_SIZE, shape=(stored, height, width, channels))
+        self.table = np.memmap(path, dtype=np.uint32, mode="r", offset=HEADER_SIZE + self.frames.nbytes, shape=(count,))
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        # A view into the mapped file, nothing is copied or decoded
+        return self.frames[self.table[index]]
+
+class FrameStoreReader:
+    # Reads frames start..stop - 1 of a frame store the way cv2.VideoCapture
+    # reads a video
+
+    def __init__(self, store, start=0, stop=None):
+        self.store = store
+        self.position = start
+        self.stop = len(store) if stop is None else stop
+
+    def read(self):
+        if self.position >= self.stop:
+            return False, None
+
+        frame = self.store[self.position]
+        self.position += 1
+
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.store.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.stop
+
+        return 0
+
+    def isOpened(self):
+        return True
+
+    def release(self):
+        pass
+
+def store_path(video_filename):
+    return f"{FRAME_DIR}/{os.path.splitext(os.path.basename(video_filename))[0]}.frames"
+
+def is_current(video_path):
+    # A store written before its video was last rendered holds old frames
+    path = store_path(video_path)
+
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(video_path)
+
+def load_deck():
+    # The single video of a segmented render and the slides in it, as frame
+    # ranges, from the slide index
+    if not os.path.exists(SLIDE_INDEX):
+        return None, None
+
+    f = open(SLIDE_INDEX)
+    index = json.load(f)
+    f.close()
+
+    return os.path.join(os.path.dirname(SLIDE_INDEX), index["video"]), index["slides"]
+
+if __name__ == "__main__":
+    # Post-compile step: turn every snippet into a frame store for run.py,
+    # scaled for the screen given as WIDTHxHEIGHT or the primary monitor
+    if len(sys.argv) > 1:
+        screen_size = tuple(int(value) for value in sys.argv[1].split("x"))
+    else:
+        screen = screeninfo.get_monitors()[0]
+        screen_size = screen.width, screen.height
+
+    os.makedirs(FRAME_DIR, exist_ok=True)
+
+    # run.py plays a packed deck from one store by slide offsets and never
+    # reads the snippets cut from it, so only the deck is converted then
+    deck, slides = load_deck()
+    if deck is not None:
+        videos = [deck]
+    else:
+        videos = [f"{VIDEO_DIR}/{filename}" for filename in sorted(os.listdir(VIDEO_DIR))]
+
+    for video in videos:
+        print(f"Converting {video}...")
+        convert(video, store_path(video), screen_size)
+
+    # Frame stores of snippets that aren't played would be picked up by run.py
+    stores = {os.path.basename(store_path(video)) for video in videos}
+    for filename in os.listdir(FRAME_DIR):
+        if filename not in stores:
+            os.remove(f"{FRAME_DIR}/{filename}")
@@ -1,12 +1,47 @@
 from manimlib import *
+from manimlib.utils.tex_file_writing import get_tex_config
+from PIL import Image
+import hashlib
+import inspect
+import json
+import manimlib
+import multiprocessing
+import pickle
 import random
 import shutil
+import subprocess
+import sys
+
+# manimgl loads this file by path, so the modules next to it aren't importable by default
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from binomial import BinomialRows, binomial_parity, diagonal_sums, sierpinski_coverage
+from fibonacci import fib_terms
 
 # "live"            Preview live presentation
 # "render"          Render to video file
 # "compile"         Compile to separate videos
+# "segment"         Render once and cut into separate videos
 MODE = "compile"
 
+# Number of sections rendered at the same time in "compile" mode
+COMPILE_WORKERS = os.cpu_count()
+CHECKPOINT_DIR = "snippets/checkpoints"
+CACHE_DIR = "snippets/cache"
+VIDEO_DIR = "snippets/videos"
+SEGMENTED_VIDEO = "snippets/presentation.mp4"
+SLIDE_INDEX = "snippets/slides.json"
+GLYPH_CACHE = "snippets/glyphs.pkl"
+
+# Rows (as a power of 2) and pixel size of the zoomed out Sierpinski triangle
+SIERPINSKI_DEPTH = 12
+SIERPINSKI_RESOLUTION = 2048
+
+PIXEL_WIDTH = 1920
+PIXEL_HEIGHT = 1080
+FRAME_RATE = 60
+RENDER_SETTINGS = f"{PIXEL_WIDTH}x{PIXEL_HEIGHT}@{FRAME_RATE}"
+
 # Clicker keycodes:
 # Left arrow:               65365   (Page up)
 # Right arrow:              65366   (Page down)
@@ -14,49 +49,340 @@ MODE = "compile"
 # Play button (second):     65307   (Escape)
 # Screen button:            46      (.)
 
-pascal_mem = {(0, 0): 1}
+binomial_rows = BinomialRows()
 
 def pascal(n, k):
-    global pascal_mem
+    return binomial_rows.get(n, k)
+
+glyph_cache = None
+glyphs_added = False
+
+def numeral(value):
+    global glyph_cache, glyphs_added
+
+    # Every process shares the same numbers, so typeset each of them only once
+    if glyph_cache is None:
+        glyph_cache = {}
+        if os.path.exists(GLYPH_CACHE):
+            try:
+                f = open(GLYPH_CACHE, "rb")
+                glyph_cache = pickle.load(f)
+                f.close()
+            except Exception:
+                print("WARNING: Couldn't read glyph cache, typesetting numbers again")
+
+    # Numbers typeset with another template or compiler look different
+    key = (repr(sorted(get_tex_config().items())), str(value))
+    if key not in glyph_cache:
+        glyph_cache[key] = Tex(str(value))
+        glyphs_added = True
+
+    return glyph_cache[key].copy()
+
+def save_glyph_cache():
+    # Written once by the process that went through the whole presentation,
+    # so renders running side by side only ever read it
+    if not glyphs_added:
+        return
+
+    os.makedirs(os.path.dirname(GLYPH_CACHE), exist_ok=True)
+    f = open(f"{GLYPH_CACHE}.{os.getpid()}", "wb")
+    pickle.dump(glyph_cache, f)
+    f.close()
+    os.replace(f"{GLYPH_CACHE}.{os.getpid()}", GLYPH_CACHE)
+
+triangle_cache = {}
+
+def triangle_rows(size, with_numbers, with_zeros, stroke_width):
+    # The rows of every kind of triangle are built once, up to the largest size
+    # asked for so far, and smaller triangles reuse the first rows
+    key = (with_numbers, with_zeros, stroke_width)
+    rows = triangle_cache.setdefault(key, [])
+
+    for n, values in enumerate(binomial_rows.stream(len(rows), size), len(rows)):
+        row = []
+
+        for k in range(n + 1):
+            square = Square(stroke_width=stroke_width)
+            square.move_to((k - n / 2, -n, 0))
+            square.set_width(1)
+            row.append(square)
+
+            if with_numbers:
+                number = numeral(values[k])
+                number.move_to((k - n / 2, -n, 0))
+                row.append(number)
+
+        if with_zeros:
+            zero_left = numeral(0)
+            zero_left.move_to((-1 - n / 2, -n, 0))
+            row.append(zero_left)
+
+            zero_right = numeral(0)
+            zero_right.move_to((1 + n / 2, -n, 0))
+            row.append(zero_right)
+
+        rows.append(row)
+
+    return rows[:size]
+
+def create_sierpinski_image(depth, resolution):
+    path = f"snippets/sierpinski_{depth}_{resolution}.png"
+
+    if not os.path.exists(path):
+        inside, odd = sierpinski_coverage(depth, resolution)
+
+        # Odd cells are white and even cells black, outside the triangle is transparent
+        rgba = np.zeros((resolution, resolution, 4), dtype=np.uint8)
+        rgba[:, :, :3] = np.round(255 * odd / np.maximum(inside, 1e-9))[:, :, None]
+        rgba[:, :, 3] = np.round(255 * inside)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.fromarray(rgba, "RGBA").save(path)
+
+    return path
+
+def settings_key(value):
+    # A stable description of the settings of an animation or play() call:
+    # numbers, strings and small arrays as they are, functions by their code
+    # since every lambda has the same name, nested animations recursively.
+    # Mobjects are left out, their data is hashed separately
+    if isinstance(value, (bool, int, float, str, type(None))):
+        return value
+    if isinstance(value, np.ndarray):
+        return value.tolist() if value.size <= 16 else None
+    if isinstance(value, (list, tuple)):
+        return [settings_key(x) for x in value]
+    if isinstance(value, dict):
+        return sorted((key, settings_key(x)) for key, x in value.items())
+    if isinstance(value, Animation):
+        return type(value).__name__, settings_key(vars(value))
+    if hasattr(value, "__code__"):
+        code = value.__code__
+        constants = [x for x in code.co_consts if not hasattr(x, "co_code")]
+        cells = [settings_key(cell.cell_contents) for cell in value.__closure__ or []]
+        return code.co_code.hex(), settings_key(constants), cells
+
+    return type(value).__name__
+
+renderer_hash = None
+
+def renderer_digest():
+    global renderer_hash
+
+    # How frames between the calls of a section are drawn isn't in the state
+    # after each call, so the code doing it (everything here but the chapters)
+    # and the manimgl it runs on are part of every section hash
+    if renderer_hash is None:
+        f = open(os.path.abspath(__file__))
+        source = f.read()
+        f.close()
 
-    if k < 0 or n < k:
-        return 0
+        for name, method in vars(PascalTrianglePresentation).items():
+            if name.startswith("chapter_"):
+                source = source.replace(inspect.getsource(method), "")
 
-    if (n, k) not in pascal_mem:
-        pascal_mem[(n, k)] = pascal(n - 1, k - 1) + pascal(n - 1, k)
+        renderer_hash = hashlib.sha1((source + manimlib.__version__).encode()).hexdigest()
 
-    return pascal_mem[(n, k)]
+    return renderer_hash
 
-fib_mem = {0: 0, 1: 1}
+asset_hashes = {}
 
-def fib(n):
-    global fib_mem
+def asset_hash(path):
+    global asset_hashes
 
-    if n not in fib_mem:
-        fib_mem[n] = fib(n - 2) + fib(n - 1)
+    if path not in asset_hashes:
+        f = open(path, "rb")
+        asset_hashes[path] = hashlib.sha1(f.read()).hexdigest()
+        f.close()
 
-    return fib_mem[n]
+    return asset_hashes[path]
+
+class PascalTriangleMesh(VMobject):
+    # The outlines of all cells as one path, with the color of every cell in
+    # its own slice of the point data, so whole regions change in one array operation
+
+    def __init__(self, size, stroke_width=4, **kwargs):
+        self.size = size
+        self.n, self.k = np.tril_indices(size)
+        super().__init__(stroke_width=stroke_width, fill_opacity=0, **kwargs)
+
+    def init_points(self):
+        corners = np.array([(-0.5, 0.5, 0), (0.5, 0.5, 0), (0.5, -0.5, 0), (-0.5, -0.5, 0)])
+        ends = np.roll(corners, -1, axis=0)
+        outline = np.stack([corners, (corners + ends) / 2, ends], axis=1).reshape(-1, 3)
+
+        centers = np.stack([self.k - self.n / 2, -self.n, np.zeros(len(self.n))], axis=1)
+        self.set_points((centers[:, None] + outline).reshape(-1, 3))
+
+    def get_cell_data(self, key):
+        # Per-point view of the data, shaped (cell, point, value)
+        data = self.data[key]
+        if len(data) != len(self.get_points()):
+            self.data[key] = data = np.repeat(data[-1:], len(self.get_points()), axis=0)
+
+        return data.reshape(len(self.n), -1, data.shape[-1])
+
+    def get_triangulation(self, normal_vector=None):
+        # Every cell is a square, so its two triangles are known from its corners.
+        # The generic ear clipping would compare every pair of cells. Like manimgl's
+        # own, the indices of all curves come first, then the inner triangles
+        cells = np.arange(0, len(self.get_points()), 12)
+        inner = (cells[:, None] + [0, 3, 6, 0, 6, 9]).reshape(-1)
+
+        self.triangulation = np.hstack([np.arange(len(self.get_points())), inner])
+        self.needs_new_triangulation = False
+        return self.triangulation
+
+    def set_cell_fill(self, color, opacity=1, mask=slice(None)):
+        self.get_cell_data("fill_rgba")[mask] = color_to_rgba(color, opacity)
+        return self
+
+class RecolorField(Animation):
+    # Fades the numbers of a triangle to the colors color_func(n, k) gives them.
+    # The colors of all their glyphs are moved into one buffer, so every frame
+    # is a single blend instead of one FadeToColor per number
+
+    def __init__(self, pascal_objects, color_func, **kwargs):
+        self.cells = [(n, k, row[k][0]) for n, row in enumerate(pascal_objects) for k in range(n + 1)]
+        self.color_func = color_func
+        super().__init__(VGroup(*[number for n, k, number in self.cells]), **kwargs)
+
+    def create_starting_mobject(self):
+        # The start colors are kept in the buffer, no copy of the numbers is needed
+        return self.mobject
+
+    def begin(self):
+        arrays = []
+        targets = []
+        for n, k, number in self.cells:
+            rgb = color_to_rgb(self.color_func(n, k))
+            for mobject in number.get_family():
+                for key in ["fill_rgba", "stroke_rgba"]:
+                    if key in mobject.data:
+                        arrays.append((mobject, key))
+                        targets.append(np.repeat([rgb], len(mobject.data[key]), axis=0))
+
+        self.buffer = np.concatenate([mobject.data[key] for mobject, key in arrays])
+        self.start = self.buffer[:, :3].copy()
+        self.target = np.concatenate(targets)
+
+        # Every mobject now reads its colors from its slice of the buffer
+        offset = 0
+        for mobject, key in arrays:
+            length = len(mobject.data[key])
+            mobject.data[key] = self.buffer[offset:offset + length]
+            offset += length
+
+        super().begin()
+
+    def interpolate_mobject(self, alpha):
+        self.buffer[:, :3] = self.start + alpha * (self.target - self.start)
+
+class AffineTarget:
+    # Where a mobject should end up, kept as a scale and shift of its points
+    # with the bounding box they lead to, instead of a moved copy of the mobject
+
+    def __init__(self, mobject):
+        self.mobject = mobject
+        self.matrix = np.identity(3)
+        self.offset = np.zeros(3)
+        self.box = mobject.get_bounding_box().copy()
+
+    def apply(self, factor, shift):
+        self.matrix = factor * self.matrix
+        self.offset = factor * self.offset + shift
+        self.box = factor * self.box + shift
+        return self
+
+    def get_center(self):
+        return self.box[1]
+
+    def get_critical_point(self, direction):
+        return np.array([self.box[1 + int(np.sign(d))][i] for i, d in enumerate(direction)])
+
+    def scale(self, factor):
+        return self.apply(factor, (1 - factor) * self.get_center())
+
+    def shift(self, vector):
+        return self.apply(1, np.array(vector))
+
+    def move_to(self, point_or_mobject):
+        if isinstance(point_or_mobject, Mobject):
+            point_or_mobject = point_or_mobject.get_center()
+
+        return self.shift(point_or_mobject - self.get_center())
+
+    def to_edge(self, edge, buff=DEFAULT_MOBJECT_TO_EDGE_BUFFER):
+        border = np.sign(edge) * np.array([FRAME_X_RADIUS, FRAME_Y_RADIUS, 0])
+        return self.shift((border - self.get_critical_point(edge) - buff * np.array(edge)) * np.abs(np.sign(edge)))
+
+class MoveToAffine(Animation):
+    # Moves a mobject to an AffineTarget by blending the transform from the
+    # identity and applying it to the original points, in place
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+        super().__init__(target.mobject, **kwargs)
+
+    def create_starting_mobject(self):
+        # The original points are all that is needed to start from
+        return self.mobject
+
+    def begin(self):
+        self.originals = [(x, x.get_points().copy()) for x in self.mobject.get_family() if x.has_points()]
+        super().begin()
+
+    def interpolate_mobject(self, alpha):
+        matrix = (1 - alpha) * np.identity(3) + alpha * self.target.matrix
+
+        for x, points in self.originals:
+            x.data["points"][:] = points @ matrix.T + alpha * self.target.offset
+        self.mobject.refresh_bounding_box(recurse_down=True)
 
 class PascalTrianglePresentation(Scene):
+    # Set by the compile driver before running the scene
+    scanning = False
+    resume_chapter = 0
+    on_boundary = None
+    frame_sink = None
+
+    # Set while a wait shows a scene that can't change, with its frame once rendered
+    holding = False
+    held_frame = None
+
     # Structure
 
     def start_presentation(self):
-        # Intro
-        self.chapter_pascal_explanation()
+        chapters = [
+            # Intro
+            self.chapter_pascal_explanation,
 
-        # Manhattan
-        self.chapter_manhattan_scenario()
+            # Manhattan
+            self.chapter_manhattan_scenario,
+
+            # Fibonacci
+            self.chapter_fibonacci_explanation,
+            self.chapter_fibonacci_comparison,
+
+            # Sierpinski
+            self.chapter_even_odd_distribution,
+            self.chapter_sierpinski_comparison,
+
+            # Outro
+            self.chapter_end_card
+        ]
 
-        # Fibonacci
-        self.chapter_fibonacci_explanation()
-        self.chapter_fibonacci_comparison()
+        for i, chapter in enumerate(chapters):
+            if i < self.resume_chapter:
+                continue
 
-        # Sierpinski
-        self.chapter_even_odd_distribution()
-        self.chapter_sierpinski_comparison()
+            if i == self.resume_chapter and i > 0:
+                self.load_checkpoint(i)
+            elif self.scanning:
+                self.save_checkpoint(i)
 
-        # Outro
-        self.chapter_end_card()
+            chapter()
 
     # Chapters
 
@@ -80,7 +406,7 @@ class PascalTrianglePresentation(Scene):
         random.seed(413)
         for n in range(size):
             for k in range(n + 1):
-                number = Tex(str(random.randint(1, 20)))
+                number = numeral(random.randint(1, 20))
                 number.move_to((k - n / 2, -n, 0))
                 random_group += number
         random_group.shift((3.6, 2.35, 0))
@@ -144,11 +470,7 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        title_text.generate_target()
-        title_text.target.scale(0.6)
-        title_text.target.to_edge(UP)
-
-        self.play(MoveToTarget(title_text))
+        self.play(MoveToAffine(AffineTarget(title_text).scale(0.6).to_edge(UP)))
 
         self.pause()
 
@@ -252,27 +574,25 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
+        stage_colors = [
+            lambda n, k: [ORANGE, BLUE][n - k < 4 and k < 3],
+            lambda n, k: rainbow_colors[(n + k) % len(rainbow_colors)],
+            lambda n, k: [RED, GREEN][int(binomial_parity(n, k))],
+            lambda n, k: WHITE
+        ]
+
         for stage in range(4):
             actions = [FadeToColor(rule_2, GREY_C)] * (stage == 0)
 
+            # The numbers are regrouped on top of the scene when the recolor
+            # begins, so it comes before the lines that are drawn over them
+            actions.append(RecolorField(pascal_objects, stage_colors[stage]))
+
             if stage > 0:
                 actions.append(Uncreate(line_groups[stage-1]))
             if stage < 4:
                 actions.append(ShowCreation(line_groups[stage]))
 
-            for n in range(size):
-                for k in range(n + 1):
-                    if stage == 0:
-                        color = [ORANGE, BLUE][n - k < 4 and k < 3]
-                    elif stage == 1:
-                        color = rainbow_colors[(n + k) % len(rainbow_colors)]
-                    elif stage == 2:
-                        color = [RED, GREEN][pascal(n, k) & 1]
-                    else:
-                        color = WHITE
-
-                    actions.append(FadeToColor(pascal_objects[n][k][0], color))
-
             self.play(*actions, run_time=0.8)
 
             if stage < 3:
@@ -318,7 +638,7 @@ class PascalTrianglePresentation(Scene):
                 crossing_group += crossing
                 crossings_row.append(crossing)
 
-                number = Tex(str(pascal(ix + iy, ix)))
+                number = numeral(pascal(ix + iy, ix))
                 number.scale(0.5)
                 number.move_to((ix, -iy, 0))
                 number_group += number
@@ -438,10 +758,7 @@ class PascalTrianglePresentation(Scene):
         street_group = Group()
         street_group += block_group
         street_group += crossing_group
-        street_group.generate_target()
-        street_group.target.shift((0, -0.6, 0))
-        street_group.target.scale(0.85)
-        self.play(MoveToTarget(street_group))
+        self.play(MoveToAffine(AffineTarget(street_group).shift((0, -0.6, 0)).scale(0.85)))
         self.play(Write(question_text), run_time=0.8)
 
         self.pause()
@@ -592,26 +909,22 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        question_text.generate_target()
-        question_text.target.shift((-0.9, 0, 0))
-        answer_text.next_to(question_text.target, RIGHT)
+        question_target = AffineTarget(question_text).shift((-0.9, 0, 0))
+        answer_text.next_to(question_target.get_critical_point(RIGHT), RIGHT)
         answer_text.shift((0.3, 0.05, 0))
         self.play(
-            MoveToTarget(question_text),
+            MoveToAffine(question_target),
             TransformMatchingParts(numbers[height][width].copy(), answer_text)
         )
 
         self.pause()
 
-        number_group.generate_target()
-        number_group.target.scale(1 / 0.85)
-        number_group.target.shift((0, 0.6, 0))
         self.play(
             FadeOut(question_text, UP),
             FadeOut(answer_text, UP),
             FadeOut(block_group, DOWN),
             FadeOut(crossing_group, DOWN),
-            MoveToTarget(number_group)
+            MoveToAffine(AffineTarget(number_group).scale(1 / 0.85).shift((0, 0.6, 0)))
         )
 
         self.pause()
@@ -630,9 +943,7 @@ class PascalTrianglePresentation(Scene):
                     to_appear_back_group += pascal_objects[n][k][0]
                     to_appear_back_group += pascal_objects[n][k][1]
                 else:
-                    numbers[n-k][k].generate_target()
-                    numbers[n-k][k].target.move_to(pascal_objects[n][k][0])
-                    transformations.append(MoveToTarget(numbers[n-k][k]))
+                    transformations.append(MoveToAffine(AffineTarget(numbers[n-k][k]).move_to(pascal_objects[n][k][0])))
                     to_appear_front_group += pascal_objects[n][k][1]
 
         self.play(
@@ -656,8 +967,8 @@ class PascalTrianglePresentation(Scene):
 
         fibonacci_objects = []
         fibonacci_group = VGroup()
-        for n in range(size):
-            number = Tex(str(fib(n)))
+        for n, value in enumerate(fib_terms(size)):
+            number = numeral(value)
             number.move_to((n - (size - 1) / 2, 0, 0))
             fibonacci_group += number
 
@@ -695,11 +1006,7 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        title_text.generate_target()
-        title_text.target.scale(0.6)
-        title_text.target.to_edge(UP)
-
-        self.play(MoveToTarget(title_text))
+        self.play(MoveToAffine(AffineTarget(title_text).scale(0.6).to_edge(UP)))
         self.play(ShowCreation(squares_group))
 
         self.pause()
@@ -789,13 +1096,14 @@ class PascalTrianglePresentation(Scene):
 
         lines, line_group = [], VGroup()
         sums, sum_group = [], VGroup()
+        sum_values = diagonal_sums(size)
         for n in range(size + 1):
             if n < size:
                 line = Line((0.75 + n / 4, 0.5 - n / 2, 0), (-0.75 - n / 2, -0.5 - n, 0), stroke_width=4, color=rainbow_colors[n % len(rainbow_colors)])
                 line_group += line
                 lines.append(line)
 
-                sum = Tex(str(fib(n + 1)), color=rainbow_colors[n % len(rainbow_colors)])
+                sum = numeral(sum_values[n]).set_color(rainbow_colors[n % len(rainbow_colors)])
             else:
                 sum = Tex("\ldots")
             sum.scale(0.8)
@@ -854,17 +1162,18 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        highlight_actions = []
+        def diagonal_color(n, k):
+            if n + k < size:
+                return rainbow_colors[(n + k) % len(rainbow_colors)]
+
+            return GREY_C
+
         sum_actions = []
         for n in range(size):
             for k in range(n + 1):
                 if n + k < size:
-                    color = rainbow_colors[(n + k) % len(rainbow_colors)]
-                    sum_actions.append(TransformMatchingTex(pascal_objects[n][k][0].copy().set_color(color), sums[n + k]))
-                    pascal_objects[n][k][1].set_fill(rainbow_colors[(n + k) % len(rainbow_colors)])
-                else:
-                    color = GREY_C
-                highlight_actions.append(FadeToColor(pascal_objects[n][k][0], color))
+                    sum_actions.append(TransformMatchingTex(pascal_objects[n][k][0].copy().set_color(diagonal_color(n, k)), sums[n + k]))
+                    pascal_objects[n][k][1].set_fill(diagonal_color(n, k))
 
         for n in range(size):
             pascal_objects[n][-2][0].set_color(rainbow_colors[(2 * n + 1) % len(rainbow_colors)])
@@ -872,7 +1181,7 @@ class PascalTrianglePresentation(Scene):
 
         self.play(
             ShowCreation(line_group),
-            *highlight_actions
+            RecolorField(pascal_objects, diagonal_color)
         )
 
         self.pause()
@@ -980,7 +1289,7 @@ class PascalTrianglePresentation(Scene):
         for n in range(size):
             for k in range(n + 1):
                 pascal_objects[n][k][1].set_fill(WHITE)
-                if pascal(n, k) & 1:
+                if binomial_parity(n, k):
                     odd_number_group += pascal_objects[n][k][0]
                     odd_square_group += pascal_objects[n][k][1]
 
@@ -992,11 +1301,7 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        title_text.generate_target()
-        title_text.target.scale(0.75)
-        title_text.target.to_edge(UP)
-
-        self.play(MoveToTarget(title_text))
+        self.play(MoveToAffine(AffineTarget(title_text).scale(0.75).to_edge(UP)))
 
         self.play(ShowCreation(pascal_group))
 
@@ -1017,18 +1322,15 @@ class PascalTrianglePresentation(Scene):
         size = 32
         height = 6
 
-        pascal_objects, pascal_group = self.create_pascal_triangle(size, with_numbers=False, stroke_width=1)
+        pascal_group = PascalTriangleMesh(size, stroke_width=1)
         pascal_group.shift((0, (size - 1) / 2, 0))
         pascal_group.scale(height / size)
 
-        to_mark = VGroup()
-        for n in range(size):
-            for k in range(n + 1):
-                if pascal(n, k) & 1:
-                    to_mark += pascal_objects[n][k]
+        to_mark = binomial_parity(pascal_group.n, pascal_group.k)
 
-        sierpinski_big_image = ImageMobject("assets/img/sierpinski_big.png")
+        sierpinski_big_image = ImageMobject(create_sierpinski_image(SIERPINSKI_DEPTH, SIERPINSKI_RESOLUTION))
         sierpinski_big_image.set_height(height)
+        zoom = size / 2 ** SIERPINSKI_DEPTH
 
         sierpinski_text = Text("Sierpiński Triangle")
         sierpinski_text.shift((0, -3.1, 0))
@@ -1045,14 +1347,11 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        self.play(to_mark.animate.set_fill(WHITE, opacity=1), run_time=2)
+        self.play(pascal_group.animate.set_cell_fill(WHITE, 1, to_mark), run_time=2)
 
         self.pause()
 
-        pascal_group.generate_target()
-        pascal_group.target.scale(0.25)
-        pascal_group.target.shift((0, height * 0.375, 0))
-        self.play(MoveToTarget(pascal_group), run_time=0.8)
+        self.play(MoveToAffine(AffineTarget(pascal_group).scale(zoom).shift((0, height * (1 - zoom) / 2, 0))), run_time=0.8)
         self.play(FadeIn(sierpinski_big_image))
         self.play(FadeOut(pascal_group), run_time=0.2)
 
@@ -1070,12 +1369,9 @@ class PascalTrianglePresentation(Scene):
 
         self.pause()
 
-        scream_image.generate_target()
-        scream_image.target.shift((-3.6, 0, 0))
-        scream_image.target.scale(height / (height + 1.6))
         self.play(
             sierpinski_big_image.animate.shift((3.6, -0.6, 0)),
-            MoveToTarget(scream_image)
+            MoveToAffine(AffineTarget(scream_image).shift((-3.6, 0, 0)).scale(height / (height + 1.6)))
         )
 
         self.pause()
@@ -1145,16 +1441,10 @@ class PascalTrianglePresentation(Scene):
         self.cont = True
 
     def pause(self, max_time=86400):
-        if MODE == "compile" and max_time > 60:
-            if self.num_plays <= self.start_at_animation_number:
-                self.wait(0.1)
-                return
-
-            f = open("temp", "w")
-            f.write(str(self.num_plays))
-            f.close()
-
-            exit()
+        if MODE in ["compile", "segment"] and max_time > 60:
+            self.section_boundary()
+            self.wait(0.1)
+            return
 
         if MODE == "render" and max_time > 60:
             max_time = 1
@@ -1163,53 +1453,162 @@ class PascalTrianglePresentation(Scene):
         self.wait_until(lambda: self.cont, max_time)
         self.cont = False
 
+    def play(self, *animations, **kwargs):
+        super().play(*animations, **kwargs)
+
+        self.fingerprint("play", settings_key(list(animations)), settings_key(kwargs))
+
+    def wait(self, duration=DEFAULT_WAIT_TIME, *args, **kwargs):
+        # Without updaters nothing moves while waiting, so the first frame is
+        # rendered and the rest repeat it. The live preview draws as usual
+        self.holding = self.window is None and not self.should_update_mobjects()
+        self.held_frame = None
+
+        super().wait(duration, *args, **kwargs)
+
+        self.holding = False
+        self.held_frame = None
+
+        self.fingerprint("wait", duration)
+
+    def update_frame(self, dt=0, ignore_skipping=False):
+        if self.holding and self.held_frame is not None:
+            self.time += dt
+            return
+
+        super().update_frame(dt, ignore_skipping)
+
+    def get_time_progression(self, run_time, *args, **kwargs):
+        # Frames this step emits when not skipping, so a dry run knows where they fall
+        self.frame_index += len(np.arange(0, run_time, 1 / self.camera.frame_rate))
+
+        return super().get_time_progression(run_time, *args, **kwargs)
+
+    def frame_writer(self):
+        # Where raw frames go, the compile driver's pipe or manim's own ffmpeg
+        if self.frame_sink is not None:
+            return self.frame_sink.write
+
+        process = getattr(self.file_writer, "writing_process", None)
+        return process.stdin.write if process is not None else None
+
+    def emit_frame(self):
+        write = self.frame_writer()
+
+        if self.holding and write is not None and not self.skip_animations:
+            if self.held_frame is None:
+                self.held_frame = self.camera.get_raw_fbo_data()
+            write(self.held_frame)
+        elif self.frame_sink is not None and not self.skip_animations:
+            self.frame_sink.write(self.camera.get_raw_fbo_data())
+        else:
+            super().emit_frame()
+
+    def section_boundary(self, last=False):
+        if self.scanning:
+            if self.section_hash is not None:
+                self.section_hashes.append(self.section_hash.hexdigest())
+
+            if not last:
+                self.sections.append(self.num_plays)
+                self.section_frames.append(self.frame_index)
+                self.section_hash = hashlib.sha1((RENDER_SETTINGS + renderer_digest()).encode())
+
+        if self.on_boundary is not None:
+            self.on_boundary(None if last else self.num_plays)
+
+    def fingerprint(self, *call):
+        if not self.scanning:
+            return
+
+        # A section is unchanged if it makes the same calls and leaves every
+        # mobject on screen in the same state after each of them
+        self.section_hash.update(repr(call).encode())
+        for mobject in self.mobjects:
+            for x in mobject.get_family():
+                for key in sorted(x.data):
+                    self.section_hash.update(key.encode())
+                    self.section_hash.update(x.data[key].tobytes())
+                self.section_hash.update(repr(sorted(getattr(x, "uniforms", {}).items())).encode())
+                for path in (getattr(x, "texture_paths", None) or {}).values():
+                    self.section_hash.update(asset_hash(path).encode())
+
+    def save_checkpoint(self, index):
+        self.checkpoints.append(self.num_plays)
+
+        state = {
+            "num_plays": self.num_plays,
+            "frame_index": self.frame_index,
+            "time": self.time,
+            "background": self.background,
+            "mobjects": [x for x in self.mobjects if x is not self.camera.frame],
+            "binomial_rows": binomial_rows
+        }
+
+        f = open(f"{CHECKPOINT_DIR}/chapter_{index:02}.pkl", "wb")
+        pickle.dump(state, f)
+        f.close()
+
+    def load_checkpoint(self, index):
+        global binomial_rows
+
+        f = open(f"{CHECKPOINT_DIR}/chapter_{index:02}.pkl", "rb")
+        state = pickle.load(f)
+        f.close()
+
+        self.remove(*[x for x in self.mobjects if x is not self.camera.frame])
+        self.background = state["background"]
+        self.add(*state["mobjects"])
+
+        # Animations before the checkpoint count as played, so boundaries still line up
+        self.num_plays = state["num_plays"]
+        self.frame_index = state["frame_index"]
+        self.time = state["time"]
+
+        binomial_rows = state["binomial_rows"]
+
     def all_objects(self):
-        return Group(*filter(lambda x: issubclass(type(x), Mobject), self.mobjects)).remove(self.background)
+        return [x for x in self.mobjects if x is not self.background and x is not self.camera.frame]
 
     def end_slide(self, transition=None):
-        all_group = self.all_objects()
+        objects = self.all_objects()
 
+        # Transitions move the camera or cover the picture, so they cost the same
+        # however much is on screen
         if transition == "slide_up":
-            all_group.generate_target()
-            all_group.target.shift((0, 10, 0))
-            self.play(MoveToTarget(all_group), run_time=0.8)
+            self.play(
+                self.camera.frame.animate.shift((0, -10, 0)),
+                self.background.animate.shift((0, -10, 0)),
+                run_time=0.8
+            )
+            self.camera.frame.shift((0, 10, 0))
+            self.background.shift((0, 10, 0))
         elif transition == "fade_out":
-            filter = Rectangle(15, 10, color=self.background_color, fill_opacity=0)
-            self.play(filter.animate.set_fill(opacity=1))
+            cover = Rectangle(15, 10, color=self.background_color, fill_opacity=0)
+            self.play(cover.animate.set_fill(opacity=1))
+            objects.append(cover)
 
-        self.remove(all_group)
+        self.remove(*objects)
 
     def create_pascal_triangle(self, size, with_numbers=True, with_zeros=False, stroke_width=4):
         pascal_objects = []
         pascal_group = VGroup()
 
-        for n in range(size):
+        for n, cached_row in enumerate(triangle_rows(size, with_numbers, with_zeros, stroke_width)):
+            mobjects = [mobject.copy() for mobject in cached_row]
+            pascal_group.add(*mobjects)
+
             row = []
 
             for k in range(n + 1):
-                square = Square(stroke_width=stroke_width)
-                square.move_to((k - n / 2, -n, 0))
-                square.set_width(1)
-                pascal_group += square
-
                 if with_numbers:
-                    number = Tex(str(pascal(n, k)))
-                    number.move_to((k - n / 2, -n, 0))
-                    pascal_group += number
-
+                    square, number = mobjects[2 * k:2 * k + 2]
                     row.append((number, square))
                 else:
-                    row.append(square)
+                    row.append(mobjects[k])
 
             if with_zeros:
-                zero_left = Tex("0")
-                zero_left.move_to((-1 - n / 2, -n, 0))
-                pascal_group += zero_left
-
-                zero_right = Tex("0")
-                zero_right.move_to((1 + n / 2, -n, 0))
-                pascal_group += zero_right
-
+                zero_left, zero_right = mobjects[-2:]
                 row.extend([(zero_right,), (zero_left,)])
 
             pascal_objects.append(row)
@@ -1229,16 +1628,25 @@ class PascalTrianglePresentation(Scene):
 
         self.cont = False
         self.click_enabled = False
-
-        if MODE in ["live", "compile"]:
+        self.frame_index = 0
+        self.sections = []
+        self.section_frames = []
+        self.section_hashes = []
+        self.section_hash = None
+        self.checkpoints = []
+
+        if MODE in ["live", "compile", "segment"]:
             count_texts = [Text(str(j)) for j in range(4)]
             count_texts[0].to_corner(LEFT + DOWN)
 
         # Animation
 
+        if MODE in ["compile", "segment"]:
+            self.section_boundary()
+
         self.add(self.background)
 
-        if MODE in ["live", "compile"]:
+        if MODE in ["live", "compile", "segment"]:
             for i in range(len(count_texts)):
                 if i > 0:
                     count_texts[i].next_to(count_texts[i-1], RIGHT)
@@ -1252,41 +1660,168 @@ class PascalTrianglePresentation(Scene):
         self.end_slide()
 
     def shutdown(self):
-        if MODE == "compile":
-            f = open("temp", "w")
-            f.write("-1")
-            f.close()
+        if MODE in ["compile", "segment"]:
+            self.section_boundary(last=True)
+            return
 
+        save_glyph_cache()
         exit()
 
+class VideoPipe:
+    def __init__(self, file_path, *ffmpeg_args):
+        stem, ext = os.path.splitext(file_path)
+        self.file_path = file_path
+        self.temp_file_path = stem + "_temp" + ext
+        self.frame_count = 0
+
+        self.process = subprocess.Popen([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-s", f"{PIXEL_WIDTH}x{PIXEL_HEIGHT}", "-pix_fmt", "rgba", "-r", str(FRAME_RATE), "-i", "-",
+            "-vf", "vflip", "-an", *ffmpeg_args,
+            "-vcodec", "libx264", "-pix_fmt", "yuv420p", self.temp_file_path
+        ], stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame)
+        self.frame_count += 1
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+        os.replace(self.temp_file_path, self.file_path)
+
+def create_scene(**attributes):
+    scene = PascalTrianglePresentation(
+        preview=False,
+        skip_animations=True,
+        leave_progress_bars=False,
+        camera_config={"pixel_width": PIXEL_WIDTH, "pixel_height": PIXEL_HEIGHT, "frame_rate": FRAME_RATE}
+    )
+
+    for key, value in attributes.items():
+        setattr(scene, key, value)
+
+    return scene
+
+def scan_sections():
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+    os.makedirs(CHECKPOINT_DIR)
+
+    scene = create_scene(scanning=True)
+    scene.run()
+    save_glyph_cache()
+
+    return scene
+
+def render_sections(resume_chapter, targets):
+    # targets maps the play number a section starts at to its output file
+    scene = create_scene(resume_chapter=resume_chapter)
+
+    def on_boundary(num_plays):
+        if scene.frame_sink is not None:
+            scene.frame_sink.close()
+            scene.frame_sink = None
+
+        if num_plays in targets:
+            print(f"Rendering {targets[num_plays]}...")
+            scene.frame_sink = VideoPipe(targets[num_plays])
+        elif num_plays is None or num_plays > max(targets):
+            raise EndSceneEarlyException()
+
+        scene.skip_animations = scene.frame_sink is None
+
+    scene.on_boundary = on_boundary
+    scene.run()
+
+def compile_snippets(workers=COMPILE_WORKERS):
+    shutil.rmtree(VIDEO_DIR, ignore_errors=True)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    os.makedirs(VIDEO_DIR)
+
+    # run.py would prefer the packed deck of an earlier segmented render
+    if os.path.exists(SLIDE_INDEX):
+        os.remove(SLIDE_INDEX)
+
+    # Pass 1: skip through the whole presentation to find the section boundaries,
+    # saving the scene at the start of every chapter along the way
+    print("Scanning sections...")
+    scan = scan_sections()
+    starts, hashes, checkpoints = scan.sections, scan.section_hashes, scan.checkpoints
+
+    dirty = [i for i in range(len(starts)) if not os.path.exists(f"{CACHE_DIR}/{hashes[i]}.mp4")]
+    print(f"{len(starts) - len(dirty)} of {len(starts)} sections unchanged")
+
+    # Pass 2: render the changed sections in parallel, every job resuming from the
+    # last chapter checkpoint before its sections and rendering them in one run
+    chunk_size = max(1, -(-len(dirty) // workers))
+    jobs = []
+    for i in dirty:
+        # The countdown sections come before the first checkpoint, chapter 0 runs from the top
+        chapter = max((j for j in range(len(checkpoints)) if checkpoints[j] <= starts[i]), default=0)
+        if not jobs or jobs[-1][0] != chapter or len(jobs[-1][1]) == chunk_size:
+            jobs.append((chapter, {}))
+        jobs[-1][1][starts[i]] = f"{CACHE_DIR}/{hashes[i]}.mp4"
+
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        pool.starmap(render_sections, jobs)
+
+    for i in range(len(starts)):
+        shutil.copyfile(f"{CACHE_DIR}/{hashes[i]}.mp4", f"{VIDEO_DIR}/snippet_{i + 1:03}.mp4")
+
+    for filename in os.listdir(CACHE_DIR):
+        if filename[:-4] not in hashes:
+            os.remove(f"{CACHE_DIR}/{filename}")
+
+def render_segmented():
+    shutil.rmtree(VIDEO_DIR, ignore_errors=True)
+    os.makedirs(VIDEO_DIR)
+
+    # The dry run tells where every slide starts, so the encoder can put a
+    # keyframe there and the video can be cut without re-encoding
+    print("Scanning sections...")
+    expected_frames = scan_sections().section_frames
+
+    keyframes = ",".join(f"{(i - 0.5) / FRAME_RATE:.6f}" for i in expected_frames[1:])
+    video = VideoPipe(SEGMENTED_VIDEO, "-force_key_frames", keyframes)
+
+    print("Rendering presentation...")
+    frames = []
+    scene = create_scene(skip_animations=False, frame_sink=video, on_boundary=lambda num_plays: frames.append(video.frame_count))
+    scene.run()
+    video.close()
+
+    if frames[:-1] != expected_frames:
+        print("WARNING: Slide boundaries moved since the scan, snippets may be cut late")
+
+    print("Cutting snippets...")
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error", "-i", SEGMENTED_VIDEO,
+        "-c", "copy", "-map", "0", "-f", "segment", "-reset_timestamps", "1", "-segment_start_number", "1",
+        "-segment_frames", ",".join(str(i) for i in frames[1:-1]),
+        f"{VIDEO_DIR}/snippet_%03d.mp4"
+    ])
+
+    index = {
+        "video": os.path.relpath(SEGMENTED_VIDEO, os.path.dirname(SLIDE_INDEX)),
+        "fps": FRAME_RATE,
+        "slides": [
+            {"file": os.path.relpath(f"{VIDEO_DIR}/snippet_{i + 1:03}.mp4", os.path.dirname(SLIDE_INDEX)), "start": frames[i], "end": frames[i + 1]}
+            for i in range(len(frames) - 1)
+        ]
+    }
+
+    f = open(SLIDE_INDEX, "w")
+    json.dump(index, f, indent=4)
+    f.close()
+
 if __name__ == "__main__":
     if MODE == "live":
         os.system("manimgl generate.py PascalTrianglePresentation -l")
     elif MODE == "render":
         os.system("manim-render generate.py PascalTrianglePresentation -w -a --file_name pascal_triangle_presentation.mp4 --hd --frame_rate 60")
     elif MODE == "compile":
-        shutil.rmtree("snippets")
-
-        f = open("temp", "w")
-        f.write("0")
-        f.close()
-
-        last = -1
-        i = 1
-        while True:
-            f = open("temp", "r")
-            start = int(f.read())
-            f.close()
-
-            if start == -1 or start == last:
-                break
-
-            print(f"Rendering section {i}...")
-            os.system(f"manim-render generate.py PascalTrianglePresentation -w -a --file_name snippet_{i:03} --video_dir snippets -n {start} --hd --frame_rate 60")
-
-            last = start
-            i += 1
-
-        os.remove("temp")
+        compile_snippets()
+    elif MODE == "segment":
+        render_segmented()
     else:
-        print("ERROR: No mode was selected")
\ No newline at end of file
+        print("ERROR: No mode was selected")
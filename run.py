@@ -1,96 +1,568 @@
+from collections import OrderedDict, deque
+import csv
 import cv2
+from framestore import FrameStore, FrameStoreReader, fit, is_current, load_deck, scale, store_path
+import numpy as np
 import os
+import queue
 import screeninfo
+import sys
+import threading
 import time
 
 WINDOW_NAME = "Pascal's Triangle"
 FULLSCREEN = True
 MOUSE_CONTROLLED = False
 
+# Decoded frames kept ready ahead of the one on screen, and ahead of the
+# start of the previous and next snippets
+PREFETCH_FRAMES = 30
+WARM_FRAMES = 2
+
+# Keys of the clicker and keyboard, and how long an idle wait for input
+# blocks before checking for mouse clicks again
+BACK_KEYS = [2162688, 2490368, 2424832]
+QUIT_KEYS = [27]
+ENTER_KEYS = [13]
+IDLE_POLL_MS = 30
+
+# time.sleep can oversleep by a whole timer tick (15.6 ms on Windows before
+# Python 3.11), so the last stretch before a deadline is spun instead
+SPIN_TIME = 0.002
+
+# Snippets kept open at once, enough for the previous, current and next one
+MAX_OPEN_SNIPPETS = 4
+
+# Every played frame is logged here, see "python run.py report <log>"
+TIMING_DIR = "snippets/timings"
+TIMING_COLUMNS = ["slide", "frame", "decode_ms", "wait_ms", "slack_ms", "display_ms", "dropped", "queued"]
+WORST_FRAMES = 10
+
+# "python run.py benchmark" plays the deck without a window or waiting for
+# input, "python run.py benchmark synthetic" plays generated slides instead
+BENCHMARK_SCREEN = 1920, 1080
+SYNTHETIC_SLIDES = 10
+SYNTHETIC_FRAMES = 180
+SYNTHETIC_FPS = 60
+
+class PresentationClock:
+    # Paces frames against absolute deadlines from the start of a snippet
+
+    def __init__(self, frame_interval):
+        self.frame_interval = frame_interval
+        self.start_time = 0
+        self.dropped = 0
+        self.late = 0
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def deadline(self, frame_number):
+        return self.start_time + frame_number * self.frame_interval
+
+    def overdue(self, frame_number):
+        # The next frame is already due, so showing this one is pointless
+        if time.perf_counter() >= self.deadline(frame_number + 1):
+            self.dropped += 1
+            return True
+
+        return False
+
+    def wait(self, frame_number):
+        deadline = self.deadline(frame_number)
+        slack = deadline - time.perf_counter()
+
+        if slack > 0:
+            if slack > SPIN_TIME:
+                time.sleep(slack - SPIN_TIME)
+            while time.perf_counter() < deadline:
+                pass
+        else:
+            self.late += 1
+
+        return slack
+
+class FramePrefetcher:
+    # Decodes a snippet on its own thread into a bounded queue, so a slow
+    # frame doesn't hold up the one being shown
+
+    def __init__(self, cap, screen_size, depth=PREFETCH_FRAMES):
+        self.cap = cap
+        self.screen_size = screen_size
+        self.frames = queue.Queue(depth)
+        self.underruns = 0
+        self.stopped = False
+        self.first_frame = None
+
+        self.thread = threading.Thread(target=self.decode, daemon=True)
+        self.thread.start()
+
+    def decode(self):
+        while True:
+            decode_start = time.perf_counter()
+            ret, frame = self.cap.read()
+
+            # Frames not stored at the screen size are scaled here, once, so
+            # imshow doesn't resample them on the display thread
+            if ret:
+                frame = scale(frame, fit(frame.shape[1], frame.shape[0], *self.screen_size))
+            decode_time = time.perf_counter() - decode_start
+
+            while not self.stopped:
+                try:
+                    self.frames.put((ret, frame, decode_time), timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+            # The snippet is closed by this thread, so stopping never waits for it
+            if self.stopped or ret == False:
+                self.cap.release()
+                return
+
+    def read(self):
+        if self.frames.empty():
+            self.underruns += 1
+
+        return self.frames.get()
+
+    def first(self):
+        # The first frame stays available until playback, so a snippet that
+        # was only shown can be shown again without decoding it again
+        if self.first_frame is None:
+            self.first_frame = self.read()
+
+        return self.first_frame
+
+    def ready(self):
+        return self.first_frame is not None or not self.frames.empty()
+
+    def depth(self):
+        return self.frames.qsize()
+
+    def set_depth(self, depth):
+        with self.frames.mutex:
+            self.frames.maxsize = depth
+            self.frames.not_full.notify_all()
+
+    def stop(self):
+        # Emptying the queue lets a decoder waiting to put a frame see it was
+        # stopped at once, without the display thread waiting for it
+        self.stopped = True
+        with self.frames.mutex:
+            self.frames.queue.clear()
+            self.frames.not_full.notify_all()
+
+class DeckVideo:
+    # The deck video, opened once and shared by the slides reading from it.
+    # Segmented renders have a keyframe at every slide start, so the seek
+    # when another slide reads next is cheap
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+        self.lock = threading.Lock()
+        self.position = 0
+
+    def read(self, position):
+        with self.lock:
+            if position != self.position:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            self.position = position + 1
+
+            return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+class ClipReader:
+    # Reads frames start..stop - 1 of the deck video
+
+    def __init__(self, video, start, stop):
+        self.video = video
+        self.position = start
+        self.stop = stop
+
+    def read(self):
+        if self.position >= self.stop:
+            return False, None
+
+        self.position += 1
+        return self.video.read(self.position - 1)
+
+    def get(self, prop):
+        return self.video.cap.get(prop)
+
+    def release(self):
+        pass
+
+class SyntheticCapture:
+    # Generated frames with the size and rate of a real snippet
+
+    def __init__(self, frame_count, size=BENCHMARK_SCREEN, fps=SYNTHETIC_FPS):
+        self.frame_count = frame_count
+        self.size = size
+        self.fps = fps
+        self.position = 0
+
+    def read(self):
+        if self.position >= self.frame_count:
+            return False, None
+
+        frame = np.full((self.size[1], self.size[0], 3), self.position % 256, dtype=np.uint8)
+        self.position += 1
+
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count
+
+        return 0
+
+    def release(self):
+        pass
+
+def open_snippet(filename):
+    # Snippets converted by framestore.py are read straight from memory,
+    # the others are decoded
+    if is_current("snippets/videos/" + filename):
+        return FrameStoreReader(FrameStore(store_path(filename)))
+
+    return cv2.VideoCapture("snippets/videos/" + filename)
+
+deck_store = deck_video = None
+
+def open_slide(slide):
+    # Slides of the packed deck are frame ranges of one store or video
+    if deck_store is not None:
+        return FrameStoreReader(deck_store, slide["start"], slide["end"])
+
+    return ClipReader(deck_video, slide["start"], slide["end"])
+
+class SnippetCaptures:
+    # Opens snippets when they are first needed and closes the least recently
+    # used ones, so only a few are ever open however long the deck is
+
+    def __init__(self, snippets, open_snippet, max_open=MAX_OPEN_SNIPPETS):
+        self.snippets = snippets
+        self.open_snippet = open_snippet
+        self.max_open = max_open
+        self.caps = OrderedDict()
+
+    def __len__(self):
+        return len(self.snippets)
+
+    def __getitem__(self, i):
+        if i in self.caps:
+            self.caps.move_to_end(i)
+            return self.caps[i]
+
+        self.caps[i] = self.open_snippet(self.snippets[i])
+        if len(self.caps) > self.max_open:
+            self.caps.popitem(last=False)[1].release()
+
+        return self.caps[i]
+
+    def rewind(self, i):
+        # Opened again from the start when next needed. The prefetcher that
+        # read it closes it
+        self.caps.pop(i, None)
+
+    def release(self):
+        for cap in self.caps.values():
+            cap.release()
+        self.caps.clear()
+
+def report(log_path):
+    # Summary of a timing log per slide, and the frames closest to being late
+    f = open(log_path, newline="")
+    rows = list(csv.DictReader(f))
+    f.close()
+
+    columns = {column: np.array([float(row[column]) for row in rows]) for column in TIMING_COLUMNS}
+    dropped = columns["dropped"] == 1
+
+    print(f"{'slide':>5} {'frames':>7} {'dropped':>8} {'late':>5}   decode p50/p95/p99 ms   display p50/p95/p99 ms   min slack ms   min queued")
+    for slide in np.unique(columns["slide"]):
+        in_slide = columns["slide"] == slide
+        shown = in_slide & ~dropped
+
+        decode = np.percentile(columns["decode_ms"][in_slide], [50, 95, 99])
+        display = np.percentile(columns["display_ms"][shown], [50, 95, 99]) if shown.any() else [np.nan] * 3
+        slack = columns["slack_ms"][shown]
+        min_slack = np.min(slack) if len(slack) else np.nan
+
+        print(
+            f"{int(slide):>5} {np.sum(in_slide):>7} {np.sum(dropped & in_slide):>8} {np.sum(slack < 0):>5}   "
+            f"{decode[0]:6.2f} {decode[1]:6.2f} {decode[2]:6.2f}     {display[0]:6.2f} {display[1]:6.2f} {display[2]:6.2f}      {min_slack:8.2f}   {int(np.min(columns['queued'][in_slide])):>10}"
+        )
+
+    print("\nWorst frames:")
+    print(f"{'slide':>5} {'frame':>6} {'slack ms':>9} {'decode ms':>10} {'wait ms':>8} {'display ms':>11} {'queued':>7}")
+    shown = np.flatnonzero(~dropped)
+    for i in shown[np.argsort(columns["slack_ms"][shown])[:WORST_FRAMES]]:
+        print(
+            f"{int(columns['slide'][i]):>5} {int(columns['frame'][i]):>6} {columns['slack_ms'][i]:9.2f} "
+            f"{columns['decode_ms'][i]:10.2f} {columns['wait_ms'][i]:8.2f} {columns['display_ms'][i]:11.2f} {int(columns['queued'][i]):>7}"
+        )
+
+benchmark = synthetic = False
+if len(sys.argv) > 1:
+    if sys.argv[1] == "report" and len(sys.argv) == 3:
+        report(sys.argv[2])
+        exit()
+    elif sys.argv[1] == "benchmark" and sys.argv[2:] in [[], ["synthetic"]]:
+        benchmark = True
+        synthetic = len(sys.argv) == 3
+    else:
+        print("Usage: python run.py [report <log> | benchmark [synthetic]]")
+        exit()
+
 snippets = caps = frame_interval = None
 try:
-    snippets = sorted(os.listdir("snippets/videos/"))
-    caps = [cv2.VideoCapture("snippets/videos/" + filename) for filename in snippets]
+    # A segmented render is played as one deck, compiled snippets one by one
+    deck, snippets = load_deck()
+    if synthetic:
+        snippets = list(range(SYNTHETIC_SLIDES))
+        caps = SnippetCaptures(snippets, lambda i: SyntheticCapture(SYNTHETIC_FRAMES))
+    elif deck is not None:
+        if is_current(deck):
+            deck_store = FrameStore(store_path(deck))
+        else:
+            deck_video = DeckVideo(deck)
+        caps = SnippetCaptures(snippets, open_slide)
+    else:
+        snippets = sorted(os.listdir("snippets/videos/"))
+        caps = SnippetCaptures(snippets, open_snippet)
     frame_interval = 1 / caps[0].get(cv2.CAP_PROP_FPS)
 except:
     print("ERROR: Couldn't read snippets")
     exit()
 
-if FULLSCREEN:
+if benchmark:
+    screen_size = BENCHMARK_SCREEN
+elif FULLSCREEN:
     screen = screeninfo.get_monitors()[0]
     cv2.namedWindow(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN)
     cv2.moveWindow(WINDOW_NAME, screen.x - 1, screen.y - 1)
     cv2.setWindowProperty(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    screen_size = screen.width, screen.height
 else:
     screen = screeninfo.get_monitors()[0]
     cv2.namedWindow(WINDOW_NAME, cv2.WND_PROP_FULLSCREEN)
     cv2.moveWindow(WINDOW_NAME, screen.x - 1, screen.y - 1)
     cv2.resizeWindow(WINDOW_NAME, screen.width // 2, screen.height // 2)
+    screen_size = screen.width // 2, screen.height // 2
 
-def pause():
-    global action
+# Input events, "forward", "back", "quit", "enter" or a digit, in the order
+# they came in, whether a slide is waiting or playing
+events = deque()
 
-    action = -1
-    while action == -1:
-        cv2.waitKey(1)
+def poll_input(delay):
+    # HighGUI only delivers keys and mouse clicks while waitKey runs on the
+    # thread that owns the window, so input is pumped from the display loop
+    # rather than a thread of its own
+    key = cv2.waitKeyEx(delay)
 
-    return action
+    if key == -1:
+        return
+    elif key in BACK_KEYS:
+        events.append("back")
+    elif key in QUIT_KEYS:
+        events.append("quit")
+    elif key in ENTER_KEYS:
+        events.append("enter")
+    elif ord("0") <= key <= ord("9"):
+        events.append(chr(key))
+    else:
+        events.append("forward")
 
-def click(event, x, y, flags, param):
-    global action
+def next_event():
+    # Blocks in short waits, so a held slide uses next to no CPU
+    while not events:
+        poll_input(IDLE_POLL_MS)
+
+    return events.popleft()
 
+def click(event, x, y, flags, param):
     if event == cv2.EVENT_LBUTTONDOWN:
-        action = 0
+        events.append("forward")
     elif event == cv2.EVENT_RBUTTONDOWN:
-        action = 1
+        events.append("back")
 
-if MOUSE_CONTROLLED:
+if MOUSE_CONTROLLED and not benchmark:
     cv2.setMouseCallback(WINDOW_NAME, click)
 
+clock = PresentationClock(frame_interval)
+underruns = 0
+
+os.makedirs(TIMING_DIR, exist_ok=True)
+timing_path = f"{TIMING_DIR}/{time.strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+timing_file = open(timing_path, "w", newline="")
+timings = csv.writer(timing_file)
+timings.writerow(TIMING_COLUMNS)
+
+prefetchers = {}
+held_frames = {}
+
+def retire(i):
+    prefetchers.pop(i).stop()
+    caps.rewind(i)
+
+def focus(center):
+    # Drop the snippets away from the current one, and the last frames of
+    # the snippets before it, and make sure the current one is decoding
+    for i in list(prefetchers):
+        if abs(i - center) > 1:
+            retire(i)
+
+    for i in list(held_frames):
+        if not center - 2 <= i < center:
+            del held_frames[i]
+
+    if center not in prefetchers:
+        prefetchers[center] = FramePrefetcher(caps[center], screen_size)
+    prefetchers[center].set_depth(PREFETCH_FRAMES)
+
+def warm_up(center):
+    # Open the snippets next to the current one once its frame is on screen
+    for i in [center - 1, center + 1]:
+        if 0 <= i < len(caps) and i not in prefetchers:
+            prefetchers[i] = FramePrefetcher(caps[i], screen_size, WARM_FRAMES)
+
 cap_number = 0
 
+# Digits typed so far to jump to a slide, counting from 1
+typed = ""
+
+frames_shown = 0
+playing_time = 0
+first_frame_times = []
+benchmark_start = time.perf_counter()
+cpu_start = time.process_time()
+slide_changed = time.perf_counter()
+
 while cap_number < len(caps):
-    cap = caps[cap_number]
-
-    ret, frame = cap.read()
-    cv2.imshow(WINDOW_NAME, frame)
-
-    if cap_number > 0:
-        action = 0
-        if not MOUSE_CONTROLLED:
-            key = cv2.waitKeyEx()
-            
-            if key in [2162688, 2490368, 2424832]:
-                action = 1
-            elif key in [27]:
-                action = 2
-        else:
-            action = pause()
+    focus(cap_number)
+    prefetcher = prefetchers[cap_number]
 
-        if action == 1:
+    # The previous snippet ended on the frame this one starts with
+    if prefetcher.ready() or cap_number - 1 not in held_frames:
+        ret, frame, decode_time = prefetcher.first()
+    else:
+        frame = held_frames[cap_number - 1]
+    if not benchmark:
+        cv2.imshow(WINDOW_NAME, frame)
+    warm_up(cap_number)
+
+    if cap_number > 0 and not benchmark:
+        event = next_event()
+
+        if event == "back":
             cap_number -= 1
-            caps[cap_number] = cv2.VideoCapture("snippets/videos/" + snippets[cap_number])
             continue
-        elif action == 2:
+        elif event == "quit":
             break
+        elif event.isdigit():
+            typed += event
+            continue
+        elif event == "enter" and typed:
+            if 1 <= int(typed) <= len(caps):
+                cap_number = int(typed) - 1
+            typed = ""
+            continue
+
+    ret, frame, decode_time = prefetcher.first()
+    first_frame_times.append(time.perf_counter() - slide_changed)
 
-    start_time = time.time()
+    clock.start()
+    frame_number = 1
+    interrupt = None
 
-    while cap.isOpened():
-        ret, frame = cap.read()
+    while True:
+        wait_start = time.perf_counter()
+        ret, next_frame, decode_time = prefetcher.read()
+        wait_time = time.perf_counter() - wait_start
+        queued = prefetcher.depth()
 
         if ret == False:
             break
 
-        cv2.imshow(WINDOW_NAME, frame)
-        cv2.waitKey(1)
+        # Skipping ahead runs through the rest of the snippet without showing
+        # it, so the next slide starts from where this one ends
+        if interrupt == "forward":
+            frame = next_frame
+            continue
+
+        # Dropped frames were already decoded on the prefetch thread, they
+        # are only left off the screen
+        if clock.overdue(frame_number):
+            timings.writerow([cap_number + 1, frame_number, f"{decode_time * 1000:.3f}", f"{wait_time * 1000:.3f}", "nan", "nan", 1, queued])
+            frame_number += 1
+            continue
+
+        frame = next_frame
+        slack = clock.wait(frame_number)
+
+        # The benchmark presents into nothing, so only the player is measured
+        display_start = time.perf_counter()
+        if not benchmark:
+            cv2.imshow(WINDOW_NAME, frame)
+            poll_input(1)
+        display_time = time.perf_counter() - display_start
+
+        timings.writerow([cap_number + 1, frame_number, f"{decode_time * 1000:.3f}", f"{wait_time * 1000:.3f}", f"{slack * 1000:.3f}", f"{display_time * 1000:.3f}", 0, queued])
+        frame_number += 1
+        frames_shown += 1
+
+        # Slide numbers typed during playback are kept for the next wait
+        if events and events[0] in ["forward", "back", "quit"]:
+            interrupt = events.popleft()
+            if interrupt != "forward":
+                break
 
-        end_time = time.time()
-        while (end_time - start_time) < frame_interval:
-            end_time = time.time()
+    if interrupt == "quit":
+        break
+    elif interrupt == "back":
+        # Back to the start of the interrupted slide
+        underruns += prefetcher.underruns
+        retire(cap_number)
+        continue
 
-        start_time = end_time
+    playing_time += time.perf_counter() - clock.start_time
+    slide_changed = time.perf_counter()
+
+    held_frames[cap_number] = frame
+    underruns += prefetcher.underruns
+    retire(cap_number)
 
     cap_number += 1
 
-cv2.destroyAllWindows()
\ No newline at end of file
+for prefetcher in prefetchers.values():
+    prefetcher.stop()
+for prefetcher in prefetchers.values():
+    prefetcher.thread.join()
+caps.release()
+if deck_video is not None:
+    deck_video.release()
+
+if not benchmark:
+    cv2.destroyAllWindows()
+
+timing_file.close()
+
+print(f"Frames dropped: {clock.dropped}, late: {clock.late}, decoder underruns: {underruns}")
+print(f"Frame timings written to {timing_path}")
+
+if benchmark:
+    # Only there on Unix, like the build server
+    import resource
+
+    cpu_time = time.process_time() - cpu_start
+    print(f"Slides: {len(first_frame_times)}, frames shown: {frames_shown} in {time.perf_counter() - benchmark_start:.2f} s")
+    print(f"Sustained fps: {frames_shown / playing_time:.2f} (target {1 / frame_interval:.2f})")
+    print(f"CPU time per frame: {cpu_time / max(frames_shown, 1) * 1000:.3f} ms")
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    print(f"Time to first frame after a slide change: mean {np.mean(first_frame_times) * 1000:.2f} ms, max {np.max(first_frame_times) * 1000:.2f} ms")